@@ -1,9 +1,21 @@
 # app.py
 
-from flask import Flask, request, jsonify
+import multiprocessing
+import queue
+import re
+import tempfile
+import threading
+import time
+
+import click
+from flask import (Flask, Response, request, jsonify, send_file,
+                   stream_with_context, url_for)
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, date
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, date, timedelta
+from decimal import Decimal
 from dateutil.relativedelta import relativedelta
 
 app = Flask(__name__)
@@ -129,6 +141,54 @@ class Category(db.Model):
     subcategory2 = db.Column(db.String(100))
     subcategory3 = db.Column(db.String(100))
 
+class Budget(db.Model):
+    __tablename__ = 'budgets'
+    id           = db.Column(db.Integer, primary_key=True)
+    name         = db.Column(db.String(100))
+    category     = db.Column(db.String(100), nullable=False)
+    subcategory1 = db.Column(db.String(100))
+    subcategory2 = db.Column(db.String(100))
+    subcategory3 = db.Column(db.String(100))
+    period       = db.Column(db.String(20), nullable=False)
+    amount       = db.Column(db.Numeric(15, 2), nullable=False)
+    alertpercent = db.Column(db.Numeric(5, 2), nullable=False, default=80)
+    accountid    = db.Column(db.Integer)
+    propertyid   = db.Column(db.Integer)
+
+class BudgetSpend(db.Model):
+    __tablename__ = 'budgetspend'
+    budgetid    = db.Column(db.Integer, primary_key=True)
+    periodstart = db.Column(db.Date, primary_key=True)
+    spent       = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    scheduled   = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+
+class ItemPrice(db.Model):
+    __tablename__ = 'itemprices'
+    itemkey  = db.Column(db.String(100), primary_key=True)
+    itemmake = db.Column(db.String(100), primary_key=True)
+    unit     = db.Column(db.String(10), primary_key=True)
+    provider = db.Column(db.String(100), primary_key=True)
+    category = db.Column(db.String(100), primary_key=True)
+    month    = db.Column(db.Date, primary_key=True)
+    spend    = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    quantity = db.Column(db.Numeric(18, 6), nullable=False, default=0)
+    lines    = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id          = db.Column(db.Integer, primary_key=True)
+    kind        = db.Column(db.String(50), nullable=False)
+    payload     = db.Column(db.JSON)
+    status      = db.Column(db.String(20), nullable=False, default='Queued')
+    progress    = db.Column(db.Integer, nullable=False, default=0)
+    attempts    = db.Column(db.Integer, nullable=False, default=0)
+    maxattempts = db.Column(db.Integer, nullable=False, default=3)
+    result      = db.Column(db.JSON)
+    error       = db.Column(db.Text)
+    runafter    = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+    created     = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+    updated     = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+
 # ----------------------
 # Helpers
 # ----------------------
@@ -141,12 +201,28 @@ def to_dict(self):
     return result
 
 for cls in (Member, Property, Account, Transaction,
-            Purchase, PurchasedItem, Bill, Income, Category):
+            Purchase, PurchasedItem, Bill, Income, Category,
+            Budget, BudgetSpend, ItemPrice, Job):
     cls.to_dict = to_dict
 
 def parse_date(date_str):
     return datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else None
 
+def _values(obj, fields):
+    return {k: getattr(obj, k) for k in fields}
+
+def _history_values(obj, fields):
+    """Pre-flush values of `fields` on obj, and whether any changed."""
+    attrs = db.inspect(obj).attrs
+    before, changed = {}, False
+    for k in fields:
+        hist = attrs[k].history
+        if hist.deleted:
+            before[k], changed = hist.deleted[0], True
+        else:
+            before[k] = getattr(obj, k)
+    return before, changed
+
 def _date_series(start, end, freq):
     """
     Yield dates from start up to end (inclusive) by freq,
@@ -170,6 +246,537 @@ def _date_series(start, end, freq):
         if end and current > end:
             break
 
+# ----------------------
+# Jobs
+# ----------------------
+# A PostgreSQL-backed work queue. Routes add a Job row inside their own
+# transaction; `flask worker` processes claim rows with
+# SELECT ... FOR UPDATE SKIP LOCKED, so no external broker is needed.
+
+JOB_POLL_SECONDS  = 2
+JOB_RETRY_SECONDS = 30
+JOB_LEASE_SECONDS = 15 * 60
+JOB_HEARTBEAT_SECONDS = 60
+
+JOB_HANDLERS = {}
+
+def job_handler(kind):
+    """Register fn(job, payload) as the handler for jobs of `kind`."""
+    def register(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return register
+
+def flag_arg(name):
+    return request.args.get(name, '').lower() in ('1', 'true', 'yes')
+
+def wants_async():
+    return flag_arg('async')
+
+def enqueue_job(kind, payload=None, maxattempts=3):
+    """Add a job to the current session; workers see it once committed."""
+    job = Job(kind=kind, payload=payload or {}, maxattempts=maxattempts)
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+def job_accepted(job):
+    return jsonify(job.to_dict()), 202, {'Location': url_for('get_job', id=job.id)}
+
+def set_job_progress(job, progress):
+    """
+    Record progress (0-100) on a separate connection so it is visible
+    while the handler's own transaction is still open.
+    """
+    jobs = Job.__table__
+    with db.engine.begin() as conn:
+        conn.execute(
+            jobs.update()
+                .where(jobs.c.id == job.id)
+                .values(progress=progress, updated=db.func.now())
+        )
+
+def claim_job():
+    """
+    Lock the next runnable job, mark it Running and commit. run_job keeps
+    `updated` fresh while the job runs, so a Running job not heard from in
+    JOB_LEASE_SECONDS belongs to a dead worker and is retried.
+    """
+    now = db.func.now()
+    job = Job.query.filter(
+        db.or_(
+            db.and_(Job.status == 'Queued', Job.runafter <= now),
+            db.and_(Job.status == 'Running',
+                    Job.updated < now - timedelta(seconds=JOB_LEASE_SECONDS))
+        )
+    ).order_by(Job.runafter, Job.id).with_for_update(skip_locked=True).first()
+    if not job:
+        db.session.rollback()
+        return None
+    job.status   = 'Running'
+    job.attempts = job.attempts + 1
+    job.updated  = now
+    db.session.commit()
+    return job
+
+def _job_heartbeat(engine, job_id, stopped):
+    """Bump a running job's `updated` every JOB_HEARTBEAT_SECONDS until stopped."""
+    jobs = Job.__table__
+    while not stopped.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    jobs.update()
+                        .where(jobs.c.id == job_id, jobs.c.status == 'Running')
+                        .values(updated=db.func.now())
+                )
+        except Exception:
+            app.logger.exception('Heartbeat for job %s failed', job_id)
+
+def run_job(job):
+    """Run a claimed job, committing its work or scheduling a retry."""
+    job_id, kind = job.id, job.kind
+    stopped = threading.Event()
+    heartbeat = threading.Thread(target=_job_heartbeat,
+                                 args=(db.engine, job_id, stopped), daemon=True)
+    heartbeat.start()
+    try:
+        try:
+            handler = JOB_HANDLERS.get(kind)
+            if not handler:
+                raise LookupError('No handler for job kind %r' % kind)
+            if job.attempts > job.maxattempts:
+                raise RuntimeError('Job lease expired %d times' % job.maxattempts)
+            result = handler(job, job.payload or {})
+            # surface write errors here, where they can be retried, rather
+            # than at the commit below
+            db.session.flush()
+        finally:
+            stopped.set()
+            heartbeat.join()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception('Job %s (%s) failed', job_id, kind)
+        job.error   = '%s: %s' % (type(e).__name__, e)
+        job.updated = db.func.now()
+        if job.attempts < job.maxattempts:
+            delay = JOB_RETRY_SECONDS * 2 ** (job.attempts - 1)
+            job.status   = 'Queued'
+            job.runafter = db.func.now() + timedelta(seconds=delay)
+        else:
+            job.status = 'Failed'
+        db.session.commit()
+        return
+    job.status   = 'Done'
+    job.progress = 100
+    job.result   = result
+    job.error    = None
+    job.updated  = db.func.now()
+    db.session.commit()
+
+def work(burst=False):
+    """Process jobs until interrupted, or until the queue is empty if burst."""
+    while True:
+        try:
+            job = claim_job()
+            if job:
+                run_job(job)
+        except Exception:
+            # e.g. the database went away mid-job; keep the worker alive and
+            # let the lease hand any half-run job to the next claim
+            app.logger.exception('Worker error')
+            db.session.rollback()
+            job = None
+            time.sleep(JOB_POLL_SECONDS)
+            continue
+        finally:
+            db.session.remove()
+        if not job:
+            if burst:
+                return
+            time.sleep(JOB_POLL_SECONDS)
+
+def _worker_process():
+    with app.app_context():
+        # never share pooled connections inherited across fork
+        db.engine.dispose(close=False)
+        work()
+
+# ----------------------
+# Budgets
+# ----------------------
+# budgetspend holds one running (spent, scheduled) total per budget and
+# period. It is kept current as transactions are flushed (see
+# _track_budget_spend) and as they are bulk-deleted (delete_transactions),
+# so reading budget status never scans transactions.
+
+# period -> (date_trunc unit, months per period)
+BUDGET_PERIODS = {
+    'Monthly':   ('month',   1),
+    'Quarterly': ('quarter', 3),
+    'Yearly':    ('year',    12),
+}
+
+BUDGET_FIELDS = ('category', 'subcategory1', 'subcategory2', 'subcategory3',
+                 'accountid', 'propertyid', 'direction', 'status',
+                 'transactiondate', 'amount')
+
+def _period_start(d, period):
+    months = BUDGET_PERIODS[period][1]
+    return date(d.year, (d.month - 1) // months * months + 1, 1)
+
+def _period_end(start, period):
+    return start + relativedelta(months=BUDGET_PERIODS[period][1], days=-1)
+
+def _budget_criteria(b):
+    """Transaction filters selecting the rows counted against budget b."""
+    criteria = [
+        Transaction.category == b.category,
+        Transaction.transactiondate != None,
+        db.or_(Transaction.direction == None, Transaction.direction != 'Income'),
+    ]
+    for k in ('subcategory1', 'subcategory2', 'subcategory3',
+              'accountid', 'propertyid'):
+        if getattr(b, k) is not None:
+            criteria.append(getattr(Transaction, k) == getattr(b, k))
+    return criteria
+
+def _budget_matches(b, entry):
+    """Python twin of _budget_criteria for a BUDGET_FIELDS dict."""
+    if entry['category'] != b.category or not entry['transactiondate']:
+        return False
+    if entry['direction'] == 'Income':
+        return False
+    return all(getattr(b, k) is None or getattr(b, k) == entry[k]
+               for k in ('subcategory1', 'subcategory2', 'subcategory3',
+                         'accountid', 'propertyid'))
+
+def _apply_budget_deltas(session, entries, sign=1):
+    """
+    Fold signed transaction amounts into budgetspend. `entries` are
+    BUDGET_FIELDS dicts; only budgets in the entries' categories are read.
+    """
+    entries = [e for e in entries if e['amount'] and e['category']]
+    if not entries:
+        return
+    # conflicts with rebuild_budget's EXCLUSIVE lock: wait for a rebuild to
+    # commit before reading budget criteria, so its new criteria are used
+    session.execute(db.text('LOCK TABLE budgetspend IN ROW EXCLUSIVE MODE'))
+    with session.no_autoflush:
+        budgets = session.query(Budget).filter(
+            Budget.category.in_({e['category'] for e in entries})
+        ).all()
+
+    totals = {}
+    for e in entries:
+        amount = sign * Decimal(str(e['amount']))
+        for b in budgets:
+            if not _budget_matches(b, e):
+                continue
+            key = (b.id, _period_start(e['transactiondate'], b.period))
+            spent, scheduled = totals.get(key, (0, 0))
+            if e['status'] == 'Scheduled':
+                scheduled += amount
+            else:
+                spent += amount
+            totals[key] = (spent, scheduled)
+    if not totals:
+        return
+
+    # sorted so concurrent writers lock budgetspend rows in the same order
+    spend = BudgetSpend.__table__
+    stmt = pg_insert(spend).values([
+        {'budgetid': k[0], 'periodstart': k[1], 'spent': v[0], 'scheduled': v[1]}
+        for k, v in sorted(totals.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['budgetid', 'periodstart'],
+        set_={'spent':     spend.c.spent + stmt.excluded.spent,
+              'scheduled': spend.c.scheduled + stmt.excluded.scheduled}
+    )
+    session.execute(stmt)
+
+@event.listens_for(db.session, 'after_flush')
+def _track_budget_spend(session, flush_context):
+    """Apply budget deltas for every Transaction inserted, updated or deleted."""
+    old, new = [], []
+    for t in session.new:
+        if isinstance(t, Transaction):
+            new.append(_values(t, BUDGET_FIELDS))
+    for t in session.deleted:
+        if isinstance(t, Transaction):
+            old.append(_values(t, BUDGET_FIELDS))
+    for t in session.dirty:
+        if not isinstance(t, Transaction):
+            continue
+        before, changed = _history_values(t, BUDGET_FIELDS)
+        if changed:
+            old.append(before)
+            new.append(_values(t, BUDGET_FIELDS))
+    _apply_budget_deltas(session, old, sign=-1)
+    _apply_budget_deltas(session, new)
+
+def delete_transactions(*criteria):
+    """
+    Bulk-delete the transactions matching `criteria`, backing them out of
+    budgetspend first (bulk deletes bypass the flush hook). Rows are
+    grouped by month so the read stays small however many are deleted.
+    """
+    month = db.cast(db.func.date_trunc('month', Transaction.transactiondate), db.Date)
+    keys = [getattr(Transaction, k) for k in BUDGET_FIELDS[:-2]]
+    rows = db.session.query(*keys, month, db.func.sum(Transaction.amount)) \
+        .filter(*criteria).group_by(*keys, month).all()
+    _apply_budget_deltas(db.session, [dict(zip(BUDGET_FIELDS, r)) for r in rows], sign=-1)
+    return Transaction.query.filter(*criteria).delete(synchronize_session=False)
+
+def rebuild_budget(b):
+    """Recompute every budgetspend row of budget b from transactions."""
+    # hold off flush-hook upserts from other transactions until we commit:
+    # anything they committed first is in the totals read below, anything
+    # later is added on top of them
+    db.session.execute(db.text('LOCK TABLE budgetspend IN EXCLUSIVE MODE'))
+    BudgetSpend.query.filter(BudgetSpend.budgetid == b.id) \
+        .delete(synchronize_session=False)
+    unit = BUDGET_PERIODS[b.period][0]
+    bucket = db.cast(db.func.date_trunc(unit, Transaction.transactiondate), db.Date)
+    scheduled = Transaction.status == 'Scheduled'
+    rows = db.session.query(
+        bucket,
+        db.func.sum(db.case((scheduled, 0), else_=Transaction.amount)),
+        db.func.sum(db.case((scheduled, Transaction.amount), else_=0))
+    ).filter(*_budget_criteria(b)).group_by(bucket).all()
+    for periodstart, spent, sched in rows:
+        db.session.add(BudgetSpend(budgetid=b.id, periodstart=periodstart,
+                                   spent=spent or 0, scheduled=sched or 0))
+
+def budget_status(b, spend, on):
+    start = _period_start(on, b.period)
+    spent = spend.spent if spend else Decimal(0)
+    projected = spent + (spend.scheduled if spend else Decimal(0))
+    limit = b.amount or Decimal(0)
+    if spent > limit:
+        alert = 'Over'
+    elif projected > limit:
+        alert = 'ProjectedOver'
+    elif spent >= limit * b.alertpercent / 100:
+        alert = 'Warning'
+    else:
+        alert = 'OK'
+    return {
+        'budget':      b.to_dict(),
+        'periodstart': start.isoformat(),
+        'periodend':   _period_end(start, b.period).isoformat(),
+        'spent':       spent,
+        'projected':   projected,
+        'remaining':   limit - spent,
+        'utilization': float(spent / limit * 100) if limit else None,
+        'alert':       alert,
+    }
+
+# ----------------------
+# Item prices
+# ----------------------
+# itemprices is a per-month rollup of purchased item lines keyed by item,
+# make, base unit, provider and category, with pack sizes parsed out of
+# volunits so prices compare per kg / L / each. Like budgetspend it is
+# maintained from the flush hook (_track_item_prices); `flask
+# refresh-prices` or the refresh_prices job rebuilds it from scratch.
+
+# unit spelling -> (base unit, multiplier)
+VOLUNITS = {
+    'mg': ('kg', Decimal('0.000001')), 'g': ('kg', Decimal('0.001')),
+    'gm': ('kg', Decimal('0.001')),    'gms': ('kg', Decimal('0.001')),
+    'gram': ('kg', Decimal('0.001')),  'kilo': ('kg', Decimal(1)),
+    'kg': ('kg', Decimal(1)),          'kgs': ('kg', Decimal(1)),
+    'oz': ('kg', Decimal('0.0283495')), 'lb': ('kg', Decimal('0.453592')),
+    'ml': ('L', Decimal('0.001')),     'cl': ('L', Decimal('0.01')),
+    'l': ('L', Decimal(1)),            'lt': ('L', Decimal(1)),
+    'ltr': ('L', Decimal(1)),          'litre': ('L', Decimal(1)),
+    'liter': ('L', Decimal(1)),
+    'ea': ('ea', Decimal(1)),          'each': ('ea', Decimal(1)),
+    'pc': ('ea', Decimal(1)),          'pcs': ('ea', Decimal(1)),
+    'pk': ('ea', Decimal(1)),          'pack': ('ea', Decimal(1)),
+    'dozen': ('ea', Decimal(12)),
+}
+
+_NUM = r'(\d+(?:\.\d+)?)'
+_VOLUNITS_RE = [
+    # '2 x 1kg', '6x375ml', '500g', '1.5 L', '6 pack', 'dozen', '12'
+    re.compile(r'^(?:%s\s*[x*]\s*)?%s?\s*([a-z]+)?$' % (_NUM, _NUM)),
+    # '1kg x 2'
+    re.compile(r'^%s?\s*([a-z]+)\s*[x*]\s*%s$' % (_NUM, _NUM)),
+]
+
+def parse_volunits(text):
+    """
+    Parse a pack description into (size, base unit), where base unit is
+    one of kg, L or ea. Blank means a single item; anything unrecognised
+    returns (None, None).
+    """
+    text = (text or '').strip().lower().replace('\u00d7', 'x')
+    if not text:
+        return Decimal(1), 'ea'
+    m = _VOLUNITS_RE[0].match(text)
+    if m:
+        count, size, unit = m.groups()
+    else:
+        m = _VOLUNITS_RE[1].match(text)
+        if not m:
+            return None, None
+        size, unit, count = m.groups()
+    if size is None and unit is None:
+        return None, None
+    if unit is None:
+        unit = 'ea'
+    if unit.endswith('s') and unit not in VOLUNITS:
+        unit = unit[:-1]
+    if unit not in VOLUNITS:
+        return None, None
+    base, scale = VOLUNITS[unit]
+    total = Decimal(count or 1) * Decimal(size or 1) * scale
+    return (total, base) if total > 0 else (None, None)
+
+def _norm(text):
+    return ' '.join((text or '').lower().split())
+
+def _item_price_entry(item, purchase):
+    """
+    Map an item line (dict of PurchasedItem fields) and its purchase (dict
+    of provider, category, purchasedate) to (itemprices key, spend,
+    quantity), or None if it cannot be priced. `price` is the line total
+    and `qty` the number of packs.
+    """
+    if not purchase or not purchase['purchasedate'] or item['price'] is None:
+        return None
+    if not _norm(item['itemname']):
+        return None
+    size, unit = parse_volunits(item['volunits'])
+    if size is None:
+        return None
+    qty = Decimal(str(item['qty'])) if item['qty'] is not None else Decimal(1)
+    key = (_norm(item['itemname']), _norm(item['itemmake']), unit,
+           (purchase['provider'] or '').strip(), purchase['category'] or '',
+           purchase['purchasedate'].replace(day=1))
+    return key, Decimal(str(item['price'])), qty * size
+
+ITEM_PRICE_FIELDS = ('id', 'purchaseid', 'itemname', 'itemmake', 'volunits', 'qty', 'price')
+PURCHASE_PRICE_FIELDS = ('provider', 'category', 'purchasedate')
+
+def _apply_item_price_deltas(session, entries, sign=1):
+    totals = {}
+    for e in entries:
+        if not e:
+            continue
+        key, spend, quantity = e
+        t = totals.get(key, (0, 0, 0))
+        totals[key] = (t[0] + sign * spend, t[1] + sign * quantity, t[2] + sign)
+    if not totals:
+        return
+
+    prices = ItemPrice.__table__
+    pk = [c.name for c in prices.primary_key]
+    stmt = pg_insert(prices).values([
+        dict(zip(pk, k), spend=v[0], quantity=v[1], lines=v[2])
+        for k, v in sorted(totals.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=pk,
+        set_={'spend':    prices.c.spend + stmt.excluded.spend,
+              'quantity': prices.c.quantity + stmt.excluded.quantity,
+              'lines':    prices.c.lines + stmt.excluded.lines}
+    )
+    session.execute(stmt)
+    session.execute(prices.delete().where(
+        db.tuple_(*[prices.c[k] for k in pk]).in_(list(totals)),
+        prices.c.lines <= 0
+    ))
+
+@event.listens_for(db.session, 'after_flush')
+def _track_item_prices(session, flush_context):
+    """Apply itemprices deltas for item lines and purchases changed by a flush."""
+    old_items, new_items = {}, {}
+    old_purchases, new_purchases = {}, {}
+
+    for o in session.new:
+        if isinstance(o, PurchasedItem):
+            new_items[o.id] = _values(o, ITEM_PRICE_FIELDS)
+        elif isinstance(o, Purchase):
+            new_purchases[o.id] = _values(o, PURCHASE_PRICE_FIELDS)
+    for o in session.deleted:
+        if isinstance(o, PurchasedItem):
+            old_items[o.id] = _values(o, ITEM_PRICE_FIELDS)
+        elif isinstance(o, Purchase):
+            old_purchases[o.id] = _values(o, PURCHASE_PRICE_FIELDS)
+    for o in session.dirty:
+        if isinstance(o, PurchasedItem):
+            before, changed = _history_values(o, ITEM_PRICE_FIELDS)
+            if changed:
+                old_items[before['id']] = before
+                new_items[o.id] = _values(o, ITEM_PRICE_FIELDS)
+        elif isinstance(o, Purchase):
+            before, changed = _history_values(o, PURCHASE_PRICE_FIELDS)
+            if changed:
+                old_purchases[o.id] = before
+                new_purchases[o.id] = _values(o, PURCHASE_PRICE_FIELDS)
+    if not (old_items or new_items or old_purchases or new_purchases):
+        return
+
+    # lines of changed purchases that were not themselves touched move
+    # from the purchase's old values to its new ones
+    changed_ids = set(old_purchases) | set(new_purchases)
+    with session.no_autoflush:
+        if changed_ids:
+            for i in session.query(PurchasedItem).filter(
+                PurchasedItem.purchaseid.in_(changed_ids),
+                ~PurchasedItem.id.in_(set(old_items) | set(new_items))
+            ):
+                item = _values(i, ITEM_PRICE_FIELDS)
+                if i.purchaseid in old_purchases:
+                    old_items[i.id] = item
+                if i.purchaseid in new_purchases:
+                    new_items[i.id] = item
+        wanted = {i['purchaseid'] for i in list(old_items.values()) + list(new_items.values())}
+        # FOR SHARE: a concurrent edit of these purchases must wait for us,
+        # or it would move our lines out of a group we have not added to yet
+        current = {p.id: _values(p, PURCHASE_PRICE_FIELDS) for p in
+                   session.query(Purchase).filter(Purchase.id.in_(wanted - changed_ids))
+                                          .with_for_update(read=True)}
+
+    before = {**current, **old_purchases}
+    after  = {**current, **new_purchases}
+    _apply_item_price_deltas(session, [
+        _item_price_entry(i, before.get(i['purchaseid'])) for i in old_items.values()
+    ], sign=-1)
+    _apply_item_price_deltas(session, [
+        _item_price_entry(i, after.get(i['purchaseid'])) for i in new_items.values()
+    ])
+
+def refresh_item_prices(job=None):
+    """Rebuild itemprices from every purchased item line."""
+    # flush-hook upserts from other transactions wait until this commits,
+    # so no line is counted both by its hook and by the scan below
+    db.session.execute(db.text('LOCK TABLE itemprices IN EXCLUSIVE MODE'))
+    ItemPrice.query.delete(synchronize_session=False)
+    total = PurchasedItem.query.count()
+    rows = db.session.query(PurchasedItem, Purchase) \
+        .join(Purchase, Purchase.id == PurchasedItem.purchaseid) \
+        .order_by(PurchasedItem.id) \
+        .yield_per(5000)
+    entries = []
+    for n, (i, p) in enumerate(rows, 1):
+        entries.append(_item_price_entry(
+            _values(i, ITEM_PRICE_FIELDS), _values(p, PURCHASE_PRICE_FIELDS)))
+        if len(entries) == 5000:
+            _apply_item_price_deltas(db.session, entries)
+            entries = []
+            if job and total:
+                set_job_progress(job, n * 100 // total)
+    _apply_item_price_deltas(db.session, entries)
+    return ItemPrice.query.count()
+
+def _unit_price(spend, quantity):
+    return (spend / quantity).quantize(Decimal('0.0001')) if quantity else None
+
 # ----------------------
 # CRUD Endpoints
 # ----------------------
@@ -523,10 +1130,10 @@ def update_bill(id):
     db.session.flush()
 
     # delete only the future transactions for this bill
-    Transaction.query.filter(
+    delete_transactions(
         Transaction.billid == b.id,
         Transaction.transactiondate >= date.today()
-    ).delete(synchronize_session=False)
+    )
 
     today = date.today()
     gen_end = b.enddate if b.enddate else b.startdate + relativedelta(years=2)
@@ -558,14 +1165,31 @@ def delete_bill(id):
     b = Bill.query.get(id)
     if not b:
         return jsonify({'msg':'Not found'}), 404
+    if wants_async():
+        job = enqueue_job('delete_bill', {'id': id})
+        db.session.commit()
+        return job_accepted(job)
+    _delete_bill(b)
+    db.session.commit()
+    return '', 204
+
+def _delete_bill(b, job=None):
     # delete all its future transactions
-    Transaction.query.filter(
-        Transaction.billid == id,
+    deleted = delete_transactions(
+        Transaction.billid == b.id,
         Transaction.transactiondate >= date.today()
-    ).delete(synchronize_session=False)
+    )
+    if job:
+        set_job_progress(job, 50)
     db.session.delete(b)
-    db.session.commit()
-    return '', 204
+    return deleted
+
+@job_handler('delete_bill')
+def delete_bill_job(job, payload):
+    b = Bill.query.get(payload['id'])
+    if not b:
+        return {'transactions': 0}
+    return {'transactions': _delete_bill(b, job)}
 
 ## Incomes & auto-generate Transactions
 @app.route('/api/incomes', methods=['GET'])
@@ -647,12 +1271,25 @@ def update_income(id):
     inc.propertyid   = d.get('propertyid')
     db.session.flush()
 
-        # delete only the future transactions for this bill
-    Transaction.query.filter(
+    if wants_async():
+        job = enqueue_job('regenerate_income', {'id': inc.id})
+        db.session.commit()
+        return job_accepted(job)
+
+    _regenerate_income(inc)
+    db.session.commit()
+    return jsonify(inc.to_dict())
+
+def _regenerate_income(inc, job=None):
+    # delete only the future transactions for this income
+    delete_transactions(
         Transaction.billid == inc.id,
         Transaction.transactiondate >= date.today()
-    ).delete(synchronize_session=False)
+    )
+    if job:
+        set_job_progress(job, 50)
 
+    count = 0
     today = date.today()
     gen_end = inc.enddate if inc.enddate else inc.startdate + relativedelta(years=2)
     for txn_date in _date_series(inc.startdate, gen_end, inc.frequency):
@@ -674,21 +1311,27 @@ def update_income(id):
             propertyid=inc.propertyid
         )
         db.session.add(txn)
+        count += 1
+    return count
 
-    db.session.commit()
-    return jsonify(inc.to_dict())
+@job_handler('regenerate_income')
+def regenerate_income_job(job, payload):
+    inc = Income.query.get(payload['id'])
+    if not inc:
+        return {'transactions': 0}
+    return {'transactions': _regenerate_income(inc, job)}
 
 @app.route('/api/incomes/<int:id>', methods=['DELETE'])
 def delete_income(id):
     inc = Income.query.get(id)
     if not inc:
         return jsonify({'msg':'Not found'}), 404
-    Transaction.query.filter(
+    delete_transactions(
         Transaction.direction == 'Income',
         Transaction.transactiondate >= date.today(),
         Transaction.billid == None,
         Transaction.purchaseid == None
-    ).delete(synchronize_session=False)
+    )
     db.session.delete(inc)
     db.session.commit()
     return '', 204
@@ -733,5 +1376,586 @@ def delete_category(id):
     db.session.commit
     return '', 204
 
+## Budgets
+BUDGET_KEYS = ('name', 'category', 'subcategory1', 'subcategory2', 'subcategory3',
+               'period', 'amount', 'alertpercent', 'accountid', 'propertyid')
+
+def _set_budget_fields(b, d):
+    # look the category up before touching b, so autoflush never sees a
+    # half-updated budget
+    c = None
+    if d.get('categoryid'):
+        with db.session.no_autoflush:
+            c = Category.query.get(d['categoryid'])
+    for k in BUDGET_KEYS:
+        setattr(b, k, d.get(k))
+    if b.alertpercent is None:
+        b.alertpercent = 80
+    if c:
+        b.category     = c.category
+        b.subcategory1 = c.subcategory1
+        b.subcategory2 = c.subcategory2
+        b.subcategory3 = c.subcategory3
+
+def _is_number(val):
+    try:
+        return val is not None and not isinstance(val, bool) \
+            and Decimal(str(val)).is_finite()
+    except ArithmeticError:
+        return False
+
+def _valid_budget(b):
+    return (b.period in BUDGET_PERIODS and bool(b.category)
+            and _is_number(b.amount) and _is_number(b.alertpercent))
+
+@app.route('/api/budgets', methods=['GET'])
+def get_budgets():
+    return jsonify([b.to_dict() for b in Budget.query.all()])
+
+@app.route('/api/budgets/status', methods=['GET'])
+def get_budgets_status():
+    on = parse_date(request.args.get('date')) or date.today()
+    budgets = Budget.query.order_by(Budget.id).all()
+    keys = [(b.id, _period_start(on, b.period)) for b in budgets]
+    spend = {}
+    if keys:
+        spend = {(s.budgetid, s.periodstart): s for s in BudgetSpend.query.filter(
+            db.tuple_(BudgetSpend.budgetid, BudgetSpend.periodstart).in_(keys)
+        )}
+    return jsonify([budget_status(b, spend.get(k), on) for b, k in zip(budgets, keys)])
+
+@app.route('/api/budgets/<int:id>', methods=['GET'])
+def get_budget(id):
+    b = Budget.query.get(id)
+    return (jsonify(b.to_dict()), 200) if b else (jsonify({'msg':'Not found'}), 404)
+
+@app.route('/api/budgets', methods=['POST'])
+def create_budget():
+    d = request.get_json()
+    b = Budget()
+    _set_budget_fields(b, d)
+    if not _valid_budget(b):
+        return jsonify({'msg':'Invalid budget'}), 400
+    db.session.add(b)
+    db.session.flush()
+    rebuild_budget(b)
+    db.session.commit()
+    return jsonify(b.to_dict()), 201
+
+@app.route('/api/budgets/<int:id>', methods=['PUT'])
+def update_budget(id):
+    d = request.get_json()
+    b = Budget.query.get(id)
+    if not b:
+        return jsonify({'msg':'Not found'}), 404
+    _set_budget_fields(b, d)
+    if not _valid_budget(b):
+        db.session.rollback()
+        return jsonify({'msg':'Invalid budget'}), 400
+    db.session.flush()
+    rebuild_budget(b)
+    db.session.commit()
+    return jsonify(b.to_dict())
+
+@app.route('/api/budgets/<int:id>', methods=['DELETE'])
+def delete_budget(id):
+    b = Budget.query.get(id)
+    if not b:
+        return jsonify({'msg':'Not found'}), 404
+    BudgetSpend.query.filter(BudgetSpend.budgetid == id) \
+        .delete(synchronize_session=False)
+    db.session.delete(b)
+    db.session.commit()
+    return '', 204
+
+## Item prices
+def _price_filters():
+    filters = [ItemPrice.itemkey == _norm(request.args.get('item'))]
+    if request.args.get('make') is not None:
+        filters.append(ItemPrice.itemmake == _norm(request.args['make']))
+    if request.args.get('unit'):
+        filters.append(ItemPrice.unit == request.args['unit'])
+    return filters
+
+def _months_back(months):
+    return date.today().replace(day=1) - relativedelta(months=months - 1)
+
+def _months_arg(default):
+    """The `months` query arg: `default` when absent, None when not a positive int."""
+    raw = request.args.get('months')
+    if not raw:
+        return default
+    try:
+        months = int(raw)
+    except ValueError:
+        return None
+    return months if months > 0 else None
+
+MONTHS_INVALID = {'msg':'months must be a positive integer'}
+
+@app.route('/api/prices/cheapest', methods=['GET'])
+def get_cheapest_providers():
+    if not request.args.get('item'):
+        return jsonify({'msg':'item is required'}), 400
+    months = _months_arg(12)
+    if not months:
+        return jsonify(MONTHS_INVALID), 400
+    spend    = db.func.sum(ItemPrice.spend)
+    quantity = db.func.sum(ItemPrice.quantity)
+    rows = db.session.query(
+        ItemPrice.provider, ItemPrice.unit, spend, quantity,
+        db.func.sum(ItemPrice.lines), db.func.max(ItemPrice.month)
+    ).filter(*_price_filters(), ItemPrice.month >= _months_back(months)) \
+     .group_by(ItemPrice.provider, ItemPrice.unit) \
+     .having(quantity > 0) \
+     .order_by(ItemPrice.unit, spend / quantity).all()
+    return jsonify([{
+        'provider':  provider,
+        'unit':      unit,
+        'unitprice': _unit_price(sp, qty),
+        'spend':     sp,
+        'quantity':  qty,
+        'lines':     lines,
+        'lastmonth': last.isoformat(),
+    } for provider, unit, sp, qty, lines, last in rows])
+
+@app.route('/api/prices/trend', methods=['GET'])
+def get_price_trend():
+    if not request.args.get('item'):
+        return jsonify({'msg':'item is required'}), 400
+    filters = _price_filters()
+    if request.args.get('provider'):
+        filters.append(ItemPrice.provider == request.args['provider'])
+    if request.args.get('months'):
+        months = _months_arg(None)
+        if not months:
+            return jsonify(MONTHS_INVALID), 400
+        filters.append(ItemPrice.month >= _months_back(months))
+    spend    = db.func.sum(ItemPrice.spend)
+    quantity = db.func.sum(ItemPrice.quantity)
+    rows = db.session.query(ItemPrice.month, ItemPrice.unit, spend, quantity,
+                            db.func.sum(ItemPrice.lines)) \
+        .filter(*filters) \
+        .group_by(ItemPrice.month, ItemPrice.unit) \
+        .having(quantity > 0) \
+        .order_by(ItemPrice.unit, ItemPrice.month).all()
+    return jsonify([{
+        'month':     month.isoformat(),
+        'unit':      unit,
+        'unitprice': _unit_price(sp, qty),
+        'spend':     sp,
+        'quantity':  qty,
+        'lines':     lines,
+    } for month, unit, sp, qty, lines in rows])
+
+@app.route('/api/prices/inflation', methods=['GET'])
+def get_price_inflation():
+    """
+    Per-category price change between the last `months` months and the
+    `months` before that, over items bought in both windows, weighting
+    each item by the quantity bought in the earlier window.
+    """
+    months = _months_arg(12)
+    if not months:
+        return jsonify(MONTHS_INVALID), 400
+    end   = date.today().replace(day=1) + relativedelta(months=1)
+    mid   = end - relativedelta(months=months)
+    start = mid - relativedelta(months=months)
+
+    def window(lo, hi):
+        keys = (ItemPrice.category, ItemPrice.itemkey, ItemPrice.itemmake, ItemPrice.unit)
+        return db.session.query(
+            *keys,
+            db.func.sum(ItemPrice.spend).label('spend'),
+            db.func.sum(ItemPrice.quantity).label('quantity')
+        ).filter(ItemPrice.month >= lo, ItemPrice.month < hi) \
+         .group_by(*keys) \
+         .having(db.func.sum(ItemPrice.quantity) > 0).subquery()
+
+    base, cur = window(start, mid), window(mid, end)
+    rows = db.session.query(
+        base.c.category,
+        db.func.count(),
+        db.func.sum(base.c.spend),
+        db.func.sum(cur.c.spend / cur.c.quantity * base.c.quantity)
+    ).join(cur, db.and_(
+        base.c.category == cur.c.category,
+        base.c.itemkey  == cur.c.itemkey,
+        base.c.itemmake == cur.c.itemmake,
+        base.c.unit     == cur.c.unit
+    )).group_by(base.c.category).order_by(base.c.category).all()
+    return jsonify([{
+        'category':  category,
+        'items':     items,
+        'basespend': basespend,
+        'inflation': float((now / basespend - 1) * 100) if basespend else None,
+    } for category, items, basespend, now in rows])
+
+@app.route('/api/prices/refresh', methods=['POST'])
+def refresh_prices():
+    job = enqueue_job('refresh_prices')
+    db.session.commit()
+    return job_accepted(job)
+
+@job_handler('refresh_prices')
+def refresh_prices_job(job, payload):
+    return {'rows': refresh_item_prices(job)}
+
+@app.cli.command('refresh-prices')
+def refresh_prices_command():
+    """Rebuild the itemprices rollup from purchased items."""
+    rows = refresh_item_prices()
+    db.session.commit()
+    click.echo('Rebuilt itemprices: %d rows' % rows)
+
+## Jobs
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    q = Job.query
+    if request.args.get('status'):
+        q = q.filter(Job.status == request.args['status'])
+    return jsonify([j.to_dict() for j in q.order_by(Job.id.desc()).limit(100)])
+
+@app.route('/api/jobs/<int:id>', methods=['GET'])
+def get_job(id):
+    j = Job.query.get(id)
+    return (jsonify(j.to_dict()), 200) if j else (jsonify({'msg':'Not found'}), 404)
+
+@app.cli.command('worker')
+@click.option('--processes', default=2, show_default=True,
+              help='Number of worker processes.')
+@click.option('--burst', is_flag=True,
+              help='Exit once the queue is empty (single process).')
+def worker_command(processes, burst):
+    """Run background job workers until interrupted."""
+    if burst:
+        work(burst=True)
+        return
+    procs = [multiprocessing.Process(target=_worker_process, daemon=True)
+             for _ in range(processes)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+## Exports
+# Columnar dumps of the ledger for offline analysis. Rows are read through a
+# server-side (named) cursor in EXPORT_BATCH_ROWS chunks so memory stays flat
+# regardless of table size; CSV goes through COPY ... TO STDOUT directly.
+# The HTTP route streams the file as it is produced; add ?spool=1 to have it
+# built on disk first instead.
+
+EXPORT_BATCH_ROWS   = 50000
+EXPORT_CHUNK_BYTES  = 1 << 20
+EXPORT_QUEUE_CHUNKS = 8
+
+# table -> (model, date column, how the account filter applies)
+EXPORT_TABLES = {
+    'transactions':   (Transaction,   'transactiondate', 'accountid'),
+    'purchases':      (Purchase,      'purchasedate',    'accountid'),
+    'purchaseditems': (PurchasedItem, None,              None),
+    'bills':          (Bill,          'startdate',       'accountid'),
+    'incomes':        (Income,        'startdate',       'accountid'),
+}
+
+EXPORT_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'csv':     ('text/csv',                       'csv'),
+}
+
+def _export_query(table, start=None, end=None, accountid=None):
+    """
+    Build (sql, params) selecting every model column of `table`,
+    filtered by date range and account.  Bills/incomes match when their
+    start/end span overlaps the range; purchased items are filtered
+    through their parent purchase.
+    """
+    model, date_col, acct_col = EXPORT_TABLES[table]
+    cols = ', '.join(c.name for c in model.__table__.columns)
+    where, params = [], []
+
+    if table == 'purchaseditems':
+        sub, sub_params = [], []
+        if start:
+            sub.append('purchasedate >= %s')
+            sub_params.append(start)
+        if end:
+            sub.append('purchasedate <= %s')
+            sub_params.append(end)
+        if accountid is not None:
+            sub.append('accountid = %s')
+            sub_params.append(accountid)
+        if sub:
+            where.append('purchaseid IN (SELECT id FROM purchases WHERE %s)'
+                         % ' AND '.join(sub))
+            params.extend(sub_params)
+    elif table in ('bills', 'incomes'):
+        if start:
+            where.append('(enddate IS NULL OR enddate >= %s)')
+            params.append(start)
+        if end:
+            where.append('startdate <= %s')
+            params.append(end)
+    else:
+        if start:
+            where.append('%s >= %%s' % date_col)
+            params.append(start)
+        if end:
+            where.append('%s <= %%s' % date_col)
+            params.append(end)
+
+    if acct_col and accountid is not None:
+        where.append('%s = %%s' % acct_col)
+        params.append(accountid)
+
+    sql = 'SELECT %s FROM %s' % (cols, table)
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY id'
+    return sql, params
+
+def _arrow_schema(model):
+    import pyarrow as pa
+    fields = []
+    for col in model.__table__.columns:
+        t = col.type
+        if isinstance(t, db.Integer):
+            typ = pa.int32()
+        elif isinstance(t, db.Numeric):
+            typ = pa.decimal128(t.precision, t.scale)
+        elif isinstance(t, db.Date):
+            typ = pa.date32()
+        else:
+            typ = pa.string()
+        fields.append(pa.field(col.name, typ))
+    return pa.schema(fields)
+
+def _parquet_batches(table, schema, start=None, end=None, accountid=None):
+    """Yield Arrow record batches of `table` read from a server-side cursor."""
+    import pyarrow as pa
+
+    sql, params = _export_query(table, start, end, accountid)
+    conn = db.engine.raw_connection()
+    try:
+        cur = conn.cursor(name='export_%s' % table)
+        cur.itersize = EXPORT_BATCH_ROWS
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_BATCH_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            yield pa.record_batch(
+                [pa.array(columns[i], type=f.type) for i, f in enumerate(schema)],
+                schema=schema
+            )
+        cur.close()
+        conn.rollback()
+    finally:
+        conn.close()
+
+def _export_parquet(table, sink, start=None, end=None, accountid=None,
+                    compression='zstd'):
+    """Write `table` into `sink` (path or binary file) as Parquet."""
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(EXPORT_TABLES[table][0])
+    count = 0
+    with pq.ParquetWriter(sink, schema, compression=compression) as writer:
+        for batch in _parquet_batches(table, schema, start, end, accountid):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+class _ChunkSink:
+    """Write-only file that hands its contents back through drain()."""
+    closed = False
+
+    def __init__(self):
+        self.chunks, self.pos = [], 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+def _stream_parquet(table, start=None, end=None, accountid=None,
+                    compression='zstd'):
+    """Yield a Parquet file of `table` in pieces, one per record batch."""
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(EXPORT_TABLES[table][0])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression=compression) as writer:
+        for batch in _parquet_batches(table, schema, start, end, accountid):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+def _copy_csv(conn, table, sink, start=None, end=None, accountid=None):
+    sql, params = _export_query(table, start, end, accountid)
+    cur = conn.cursor()
+    query = cur.mogrify(sql, params).decode()
+    cur.copy_expert('COPY (%s) TO STDOUT WITH (FORMAT csv, HEADER)' % query, sink)
+    count = cur.rowcount
+    cur.close()
+    conn.rollback()
+    return count
+
+def _export_csv(table, sink, start=None, end=None, accountid=None):
+    """Write `table` into the binary file `sink` via COPY ... TO STDOUT."""
+    conn = db.engine.raw_connection()
+    try:
+        return _copy_csv(conn, table, sink, start, end, accountid)
+    finally:
+        conn.close()
+
+class _QueueSink:
+    """
+    File handed to copy_expert on a producer thread: rows are gathered into
+    EXPORT_CHUNK_BYTES pieces and passed through a bounded queue, so COPY
+    only runs as fast as the client reads.
+    """
+    def __init__(self, chunks, stopped):
+        self.chunks, self.stopped = chunks, stopped
+        self.buf, self.size = [], 0
+
+    def put(self, item):
+        while True:
+            if self.stopped.is_set():
+                raise IOError('export cancelled')
+            try:
+                self.chunks.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def write(self, data):
+        self.buf.append(bytes(data))
+        self.size += len(data)
+        if self.size >= EXPORT_CHUNK_BYTES:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buf:
+            self.put(b''.join(self.buf))
+            self.buf, self.size = [], 0
+
+def _stream_csv(table, start=None, end=None, accountid=None):
+    """Yield `table` as CSV straight from COPY ... TO STDOUT."""
+    chunks = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+    stopped = threading.Event()
+    sink = _QueueSink(chunks, stopped)
+    conn = db.engine.raw_connection()
+
+    def produce():
+        try:
+            _copy_csv(conn, table, sink, start, end, accountid)
+            sink.flush()
+            sink.put(None)
+        except Exception as e:
+            if not stopped.is_set():
+                sink.put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        if producer.is_alive():
+            # client went away mid-export: abort the COPY on the server and
+            # drop the connection rather than pool it in an unknown state
+            conn.driver_connection.cancel()
+            producer.join()
+            conn.invalidate()
+        else:
+            producer.join()
+            conn.close()
+
+def export_table(table, fmt, sink, start=None, end=None, accountid=None):
+    if fmt == 'parquet':
+        return _export_parquet(table, sink, start, end, accountid)
+    return _export_csv(table, sink, start, end, accountid)
+
+def stream_table(table, fmt, start=None, end=None, accountid=None):
+    if fmt == 'parquet':
+        return _stream_parquet(table, start, end, accountid)
+    return _stream_csv(table, start, end, accountid)
+
+@app.route('/api/export/<table>', methods=['GET'])
+def export(table):
+    if table not in EXPORT_TABLES:
+        return jsonify({'msg':'Not found'}), 404
+    fmt = request.args.get('format', 'parquet')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'msg':'Unsupported format'}), 400
+    accountid = request.args.get('accountid')
+    if accountid is not None:
+        try:
+            accountid = int(accountid)
+        except ValueError:
+            return jsonify({'msg':'accountid must be an integer'}), 400
+    start = parse_date(request.args.get('start'))
+    end   = parse_date(request.args.get('end'))
+    mimetype, ext = EXPORT_FORMATS[fmt]
+    filename = '%s.%s' % (table, ext)
+
+    if flag_arg('spool'):
+        # fallback for clients that need a Content-Length: build the whole
+        # file on disk first, then send it
+        f = tempfile.TemporaryFile()
+        export_table(table, fmt, f, start, end, accountid)
+        f.seek(0)
+        return send_file(f, mimetype=mimetype, as_attachment=True,
+                         download_name=filename)
+
+    return Response(
+        stream_with_context(stream_table(table, fmt, start, end, accountid)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': 'attachment; filename=%s' % filename}
+    )
+
+@app.cli.command('export')
+@click.argument('table', type=click.Choice(sorted(EXPORT_TABLES)))
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'fmt', type=click.Choice(sorted(EXPORT_FORMATS)),
+              help='Output format (default: from PATH extension, else parquet).')
+@click.option('--start', help='Earliest date, YYYY-MM-DD.')
+@click.option('--end', help='Latest date, YYYY-MM-DD.')
+@click.option('--accountid', type=int)
+def export_command(table, path, fmt, start, end, accountid):
+    """Export TABLE to PATH as Parquet or CSV."""
+    if not fmt:
+        fmt = 'csv' if path.lower().endswith('.csv') else 'parquet'
+    with open(path, 'wb') as f:
+        count = export_table(table, fmt, f, parse_date(start),
+                             parse_date(end), accountid)
+    click.echo('Exported %d rows from %s to %s' % (count, table, path))
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -159,6 +159,63 @@ ALTER SEQUENCE public.bills_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.bills_id_seq OWNED BY public.bills.id;
 
 
+--
+-- Name: budgets; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.budgets (
+    id integer NOT NULL,
+    name text,
+    category text NOT NULL,
+    subcategory1 text,
+    subcategory2 text,
+    subcategory3 text,
+    period text NOT NULL,
+    amount numeric(15,2) NOT NULL,
+    alertpercent numeric(5,2) DEFAULT 80 NOT NULL,
+    accountid integer,
+    propertyid integer
+);
+
+
+ALTER TABLE public.budgets OWNER TO postgres;
+
+--
+-- Name: budgets_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE public.budgets_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE public.budgets_id_seq OWNER TO postgres;
+
+--
+-- Name: budgets_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: postgres
+--
+
+ALTER SEQUENCE public.budgets_id_seq OWNED BY public.budgets.id;
+
+
+--
+-- Name: budgetspend; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.budgetspend (
+    budgetid integer NOT NULL,
+    periodstart date NOT NULL,
+    spent numeric(15,2) DEFAULT 0 NOT NULL,
+    scheduled numeric(15,2) DEFAULT 0 NOT NULL
+);
+
+
+ALTER TABLE public.budgetspend OWNER TO postgres;
+
 --
 -- Name: categories; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -196,6 +253,69 @@ ALTER SEQUENCE public.categories_id_seq OWNER TO postgres;
 ALTER SEQUENCE public.categories_id_seq OWNED BY public.categories.id;
 
 
+--
+-- Name: itemprices; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.itemprices (
+    itemkey text NOT NULL,
+    itemmake text NOT NULL,
+    unit text NOT NULL,
+    provider text NOT NULL,
+    category text NOT NULL,
+    month date NOT NULL,
+    spend numeric(15,2) DEFAULT 0 NOT NULL,
+    quantity numeric(18,6) DEFAULT 0 NOT NULL,
+    lines integer DEFAULT 0 NOT NULL
+);
+
+
+ALTER TABLE public.itemprices OWNER TO postgres;
+
+--
+-- Name: jobs; Type: TABLE; Schema: public; Owner: postgres
+--
+
+CREATE TABLE public.jobs (
+    id integer NOT NULL,
+    kind text NOT NULL,
+    payload json,
+    status text DEFAULT 'Queued'::text NOT NULL,
+    progress integer DEFAULT 0 NOT NULL,
+    attempts integer DEFAULT 0 NOT NULL,
+    maxattempts integer DEFAULT 3 NOT NULL,
+    result json,
+    error text,
+    runafter timestamp without time zone DEFAULT now() NOT NULL,
+    created timestamp without time zone DEFAULT now() NOT NULL,
+    updated timestamp without time zone DEFAULT now() NOT NULL
+);
+
+
+ALTER TABLE public.jobs OWNER TO postgres;
+
+--
+-- Name: jobs_id_seq; Type: SEQUENCE; Schema: public; Owner: postgres
+--
+
+CREATE SEQUENCE public.jobs_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+
+ALTER SEQUENCE public.jobs_id_seq OWNER TO postgres;
+
+--
+-- Name: jobs_id_seq; Type: SEQUENCE OWNED BY; Schema: public; Owner: postgres
+--
+
+ALTER SEQUENCE public.jobs_id_seq OWNED BY public.jobs.id;
+
+
 --
 -- Name: members; Type: TABLE; Schema: public; Owner: postgres
 --
@@ -466,6 +586,13 @@ ALTER TABLE ONLY public.accounts ALTER COLUMN id SET DEFAULT nextval('public.acc
 ALTER TABLE ONLY public.bills ALTER COLUMN id SET DEFAULT nextval('public.bills_id_seq'::regclass);
 
 
+--
+-- Name: budgets id; Type: DEFAULT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.budgets ALTER COLUMN id SET DEFAULT nextval('public.budgets_id_seq'::regclass);
+
+
 --
 -- Name: categories id; Type: DEFAULT; Schema: public; Owner: postgres
 --
@@ -473,6 +600,13 @@ ALTER TABLE ONLY public.bills ALTER COLUMN id SET DEFAULT nextval('public.bills_
 ALTER TABLE ONLY public.categories ALTER COLUMN id SET DEFAULT nextval('public.categories_id_seq'::regclass);
 
 
+--
+-- Name: jobs id; Type: DEFAULT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.jobs ALTER COLUMN id SET DEFAULT nextval('public.jobs_id_seq'::regclass);
+
+
 --
 -- Name: members id; Type: DEFAULT; Schema: public; Owner: postgres
 --
@@ -539,6 +673,22 @@ COPY public.bills (id, name, category, subcategory1, subcategory2, subcategory3,
 \.
 
 
+--
+-- Data for Name: budgets; Type: TABLE DATA; Schema: public; Owner: postgres
+--
+
+COPY public.budgets (id, name, category, subcategory1, subcategory2, subcategory3, period, amount, alertpercent, accountid, propertyid) FROM stdin;
+\.
+
+
+--
+-- Data for Name: budgetspend; Type: TABLE DATA; Schema: public; Owner: postgres
+--
+
+COPY public.budgetspend (budgetid, periodstart, spent, scheduled) FROM stdin;
+\.
+
+
 --
 -- Data for Name: categories; Type: TABLE DATA; Schema: public; Owner: postgres
 --
@@ -547,6 +697,22 @@ COPY public.categories (id, category, subcategory1, subcategory2, subcategory3)
 \.
 
 
+--
+-- Data for Name: itemprices; Type: TABLE DATA; Schema: public; Owner: postgres
+--
+
+COPY public.itemprices (itemkey, itemmake, unit, provider, category, month, spend, quantity, lines) FROM stdin;
+\.
+
+
+--
+-- Data for Name: jobs; Type: TABLE DATA; Schema: public; Owner: postgres
+--
+
+COPY public.jobs (id, kind, payload, status, progress, attempts, maxattempts, result, error, runafter, created, updated) FROM stdin;
+\.
+
+
 --
 -- Data for Name: members; Type: TABLE DATA; Schema: public; Owner: postgres
 --
@@ -626,6 +792,13 @@ SELECT pg_catalog.setval('public.accounts_id_seq', 1, false);
 SELECT pg_catalog.setval('public.bills_id_seq', 1, false);
 
 
+--
+-- Name: budgets_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
+--
+
+SELECT pg_catalog.setval('public.budgets_id_seq', 1, false);
+
+
 --
 -- Name: categories_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
 --
@@ -633,6 +806,13 @@ SELECT pg_catalog.setval('public.bills_id_seq', 1, false);
 SELECT pg_catalog.setval('public.categories_id_seq', 1, false);
 
 
+--
+-- Name: jobs_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
+--
+
+SELECT pg_catalog.setval('public.jobs_id_seq', 1, false);
+
+
 --
 -- Name: members_id_seq; Type: SEQUENCE SET; Schema: public; Owner: postgres
 --
@@ -699,6 +879,22 @@ ALTER TABLE ONLY public.bills
     ADD CONSTRAINT bills_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: budgets budgets_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.budgets
+    ADD CONSTRAINT budgets_pkey PRIMARY KEY (id);
+
+
+--
+-- Name: budgetspend budgetspend_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.budgetspend
+    ADD CONSTRAINT budgetspend_pkey PRIMARY KEY (budgetid, periodstart);
+
+
 --
 -- Name: categories categories_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -707,6 +903,22 @@ ALTER TABLE ONLY public.categories
     ADD CONSTRAINT categories_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: itemprices itemprices_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.itemprices
+    ADD CONSTRAINT itemprices_pkey PRIMARY KEY (itemkey, itemmake, unit, provider, category, month);
+
+
+--
+-- Name: jobs jobs_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
+--
+
+ALTER TABLE ONLY public.jobs
+    ADD CONSTRAINT jobs_pkey PRIMARY KEY (id);
+
+
 --
 -- Name: members members_pkey; Type: CONSTRAINT; Schema: public; Owner: postgres
 --
@@ -755,6 +967,27 @@ ALTER TABLE ONLY public.transactions
     ADD CONSTRAINT transactions_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: budgets_category_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX budgets_category_idx ON public.budgets USING btree (category);
+
+
+--
+-- Name: itemprices_month_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX itemprices_month_idx ON public.itemprices USING btree (month);
+
+
+--
+-- Name: jobs_runnable_idx; Type: INDEX; Schema: public; Owner: postgres
+--
+
+CREATE INDEX jobs_runnable_idx ON public.jobs USING btree (runafter, id) WHERE (status = ANY (ARRAY['Queued'::text, 'Running'::text]));
+
+
 --
 -- PostgreSQL database dump complete
 --